@@ -0,0 +1,367 @@
+import os
+import sys
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import secrets
+import signal
+import ssl
+import time
+from typing import Optional
+
+import main as hoster
+
+# Worker agent: hosts bots for a controller (main.py with WORKER_AGENTS set) on another machine,
+# or next to it for testing. It runs extraction, installs and supervision with the hoster's own
+# code and settings, in its working directory, and answers the controller over one TCP session:
+#
+#   AGENT_SECRET=... AGENT_PORT=7701 python /path/to/agent.py
+#
+# Every message is one JSON line. On connect the agent sends {"nonce"}, the controller answers
+# {"auth": HMAC-SHA256(AGENT_SECRET, "controller:" + nonce), "nonce"} with a nonce of its own and
+# gets {"ok": true, "auth": HMAC-SHA256(AGENT_SECRET, "agent:" + its nonce)}. Calls are
+# {"id", "method", "params"} answered by {"id", "result"} or {"id", "error"}; the agent also
+# pushes {"event": "progress"} lines during deploys and {"event": "report"} with its free memory,
+# load and the state of its bots every AGENT_REPORT_INTERVAL.
+
+AGENT_HOST = os.environ.get("AGENT_HOST", "127.0.0.1")  # Address to listen on; use a private network or TLS when not local
+AGENT_PORT = int(os.environ.get("AGENT_PORT", "7700"))
+AGENT_TLS_CERT = os.environ.get("AGENT_TLS_CERT", "")  # Certificate (with AGENT_TLS_KEY) to serve TLS; empty serves plain TCP
+AGENT_TLS_KEY = os.environ.get("AGENT_TLS_KEY", "")
+AGENT_REPORT_INTERVAL = float(os.environ.get("AGENT_REPORT_INTERVAL", "5"))  # Seconds between reports to the controller
+AGENT_AUTH_TIMEOUT = 10  # Seconds a controller may take to authenticate
+
+logger = logging.getLogger("agent")
+
+class RemoteStatus:
+    """Stands in for a deploy's Telegram status message, forwarding its edits to the controller."""
+
+    def __init__(self, session: "ControllerSession", user_id: int):
+        self.session = session
+        self.user_id = user_id
+
+    async def edit_text(self, text: str) -> None:
+        try:
+            await self.session.send({'event': "progress", 'user_id': self.user_id, 'text': text})
+        except ConnectionError:
+            # Progress is best effort; the deploy carries on without its controller
+            pass
+
+def host_report() -> dict:
+    """Free memory, load and bot counts the controller places deploys by."""
+    available, _ = hoster.read_memory_pressure()
+    return {
+        'memory_available': available or 0,
+        'load': os.getloadavg()[0],
+        'cpus': os.cpu_count() or 1,
+        'bots': len(hoster.active_bots),
+        'running': sum(1 for bot_info in list(hoster.active_bots.values()) if bot_info.is_running()),
+        'deploys': len(hoster.deploy_jobs),
+    }
+
+def get_bot(user_id: int) -> "hoster.BotHandle":
+    bot_info = hoster.active_bots.get(user_id)
+    if bot_info is None:
+        raise Exception(f"no bot for user {user_id} on this agent")
+    return bot_info
+
+def package_part_path(zip_hash: str) -> str:
+    return f"{hoster.NAND_ZIP_PATH}.{zip_hash[:16]}.part"
+
+async def rpc_package(session, hash: str) -> dict:
+    """Whether Nand.zip is present in the given version."""
+    present = os.path.exists(hoster.NAND_ZIP_PATH) and hoster.nand_zip_hash() == hash
+    return {'present': present}
+
+async def rpc_upload(session, hash: str, offset: int, data: str, done: bool = False) -> dict:
+    """Write one chunk of Nand.zip; the last call checks the hash and puts the file in place."""
+    path = package_part_path(hash)
+    if not done:
+        with open(path, "r+b" if offset else "wb") as f:
+            f.seek(offset)
+            f.write(base64.b64decode(data))
+        return {}
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    if digest.hexdigest() != hash:
+        os.unlink(path)
+        raise Exception("uploaded package does not match its hash")
+    # The template is rebuilt from the new file on the next deploy
+    os.replace(path, hoster.NAND_ZIP_PATH)
+    logger.info(f"Received {hoster.NAND_ZIP_PATH} ({hash[:12]})")
+    return {}
+
+async def rpc_deploy(session, user_id: int, env_file: str, token: str) -> dict:
+    """Set up and start a bot, returning its snapshot once it is ready."""
+    if user_id in hoster.deploy_jobs:
+        raise Exception(f"a deploy for user {user_id} is already running")
+    if user_id in hoster.active_bots:
+        # A retried deploy, or a bot moved back here
+        await hoster.teardown_bots([user_id])
+
+    job = hoster.DeployJob(user_id)
+    status = RemoteStatus(session, user_id)
+    job.set_status_message(status)
+
+    async def run() -> "hoster.BotHandle":
+        try:
+            handle = await hoster.deploy_bot(user_id, env_file, token, job, status)
+        except BaseException:
+            await hoster.cleanup_failed_deploy(user_id, None)
+            raise
+        handle.last_ping = time.time()
+        handle.auto_restart = True
+        hoster.active_bots[user_id] = handle
+        hoster.state_store.save_bot(handle)
+        return handle
+
+    hoster.deploy_jobs[user_id] = job
+    job.task = asyncio.create_task(run())
+    job.task.add_done_callback(job.forget)
+    try:
+        handle = await job.task
+    except asyncio.CancelledError:
+        if job.cancelled_by_user:
+            raise Exception("deploy cancelled")
+        raise
+    logger.info(f"Deployed bot @{handle.username} for user {user_id}")
+    return handle.snapshot()
+
+async def rpc_teardown(session, user_id: int, grace: float = hoster.STOP_GRACE_PERIOD) -> dict:
+    """Cancel a deploy in flight, or stop a bot and remove its files."""
+    job = hoster.deploy_jobs.get(user_id)
+    if job:
+        job.cancel()
+        await asyncio.gather(job.task, return_exceptions=True)
+    summary = await hoster.teardown_bots([user_id], grace=grace)
+    if summary['failed']:
+        raise Exception(summary['failed'][0][1])
+    return {'killed': bool(summary['killed'])}
+
+async def rpc_export(session, user_id: int) -> dict:
+    """Stop a bot that is moving to another agent, keeping its files until the move is done."""
+    bot_info = get_bot(user_id)
+    env_file = await bot_info.export()
+    hoster.state_store.save_bot(bot_info)
+    return {'env_file': env_file}
+
+async def rpc_env(session, user_id: int) -> dict:
+    return {'env_file': await get_bot(user_id).read_env()}
+
+async def rpc_resume(session, user_id: int) -> dict:
+    bot_info = get_bot(user_id)
+    seconds = await bot_info.resume()
+    return {'seconds': seconds, 'bot': bot_info.snapshot()}
+
+async def rpc_schedule(session, user_id: int, resume_at: Optional[str]) -> dict:
+    bot_info = get_bot(user_id)
+    bot_info.set_resume_schedule(resume_at)
+    hoster.state_store.save_bot(bot_info)
+    return {}
+
+async def rpc_prepare(session) -> dict:
+    """Build the template and venv of the current Nand.zip ahead of a rolling upgrade."""
+    _, _, version = await hoster.prepare_package()
+    return {'version': version}
+
+async def rpc_upgrade(session, user_id: int) -> dict:
+    """Restart a bot on the current Nand.zip, returning its snapshot once it is ready again."""
+    bot_info = get_bot(user_id)
+    await bot_info.upgrade()
+    return bot_info.snapshot()
+
+async def rpc_rollback_upgrade(session, user_id: int) -> dict:
+    bot_info = get_bot(user_id)
+    await bot_info.rollback_upgrade()
+    return bot_info.snapshot()
+
+async def rpc_finish_upgrade(session, user_id: int) -> dict:
+    await get_bot(user_id).finish_upgrade()
+    return {}
+
+async def rpc_log(session, user_id: int, lines: int) -> dict:
+    return await get_bot(user_id).read_log(lines)
+
+async def rpc_log_since(session, user_id: int, offset: int, inode: Optional[int]) -> dict:
+    return await get_bot(user_id).read_log_since(offset, inode)
+
+METHODS = {
+    'package': rpc_package,
+    'upload': rpc_upload,
+    'deploy': rpc_deploy,
+    'teardown': rpc_teardown,
+    'export': rpc_export,
+    'env': rpc_env,
+    'resume': rpc_resume,
+    'schedule': rpc_schedule,
+    'prepare': rpc_prepare,
+    'upgrade': rpc_upgrade,
+    'rollback_upgrade': rpc_rollback_upgrade,
+    'finish_upgrade': rpc_finish_upgrade,
+    'log': rpc_log,
+    'log_since': rpc_log_since,
+}
+
+class ControllerSession:
+    """One authenticated connection from the controller."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.peer = writer.get_extra_info("peername")
+        self._write_lock = asyncio.Lock()
+        self._reported: dict = {}  # user_id: snapshot last sent
+        self._tasks: set = set()
+
+    async def send(self, message: dict) -> None:
+        async with self._write_lock:
+            await hoster.send_message(self.writer, message)
+
+    async def authenticate(self) -> bool:
+        nonce = secrets.token_hex(16)
+        await hoster.send_message(self.writer, {'nonce': nonce})
+        try:
+            reply = await asyncio.wait_for(hoster.read_message(self.reader), timeout=AGENT_AUTH_TIMEOUT)
+        except (asyncio.TimeoutError, ValueError):
+            reply = None
+        if (not reply or 'nonce' not in reply
+                or not hmac.compare_digest(str(reply.get('auth', "")), hoster.agent_signature(nonce, "controller"))):
+            logger.warning(f"Rejected connection from {self.peer}: authentication failed")
+            await hoster.send_message(self.writer, {'error': "authentication failed"})
+            return False
+        # Prove the secret in turn, so the controller knows it is not handing bots to an impostor
+        await hoster.send_message(self.writer, {'ok': True, 'auth': hoster.agent_signature(str(reply['nonce']), "agent")})
+        return True
+
+    async def run(self) -> None:
+        try:
+            if not await self.authenticate():
+                return
+            logger.info(f"Controller connected from {self.peer}")
+            reporter = asyncio.create_task(self.report())
+            try:
+                while True:
+                    request = await hoster.read_message(self.reader)
+                    if request is None:
+                        break
+                    # Calls run concurrently; a deploy must not hold up a teardown
+                    task = asyncio.create_task(self.handle(request))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+            finally:
+                reporter.cancel()
+            logger.info(f"Controller at {self.peer} disconnected")
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Connection from {self.peer} failed: {e}")
+        finally:
+            # Deploys already running finish and are kept; the controller settles them on reconnect
+            self.writer.close()
+
+    async def handle(self, request: dict) -> None:
+        method = METHODS.get(request.get('method'))
+        try:
+            if method is None:
+                raise Exception(f"unknown method {request.get('method')}")
+            response = {'id': request['id'], 'result': await method(self, **request.get('params', {}))}
+        except Exception as e:
+            logger.error(f"Error in {request.get('method')} call: {e}")
+            response = {'id': request.get('id'), 'error': str(e) or type(e).__name__}
+        try:
+            await self.send(response)
+        except ConnectionError:
+            pass
+
+    async def report(self) -> None:
+        """Send host load and every bot's state, after the first report only what changed."""
+        full = True
+        while True:
+            snapshots = {user_id: bot_info.snapshot() for user_id, bot_info in list(hoster.active_bots.items())}
+            bots = {
+                user_id: snapshot for user_id, snapshot in snapshots.items()
+                if full or self._reported.get(user_id) != snapshot
+            }
+            self._reported = snapshots
+            try:
+                await self.send({'event': "report", 'full': full, 'host': host_report(), 'bots': bots})
+            except ConnectionError:
+                return
+            full = False
+            await asyncio.sleep(AGENT_REPORT_INTERVAL)
+
+def server_ssl_context() -> Optional[ssl.SSLContext]:
+    if not AGENT_TLS_CERT:
+        return None
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(AGENT_TLS_CERT, AGENT_TLS_KEY or None)
+    return context
+
+async def collect_venv_garbage() -> None:
+    while True:
+        await asyncio.sleep(hoster.VENV_GC_INTERVAL)
+        try:
+            await hoster.gc_venv_cache()
+        except Exception as e:
+            logger.error(f"Error collecting stale venvs: {e}")
+
+async def serve() -> None:
+    await hoster.restore_state()
+
+    # The same background work the hoster runs for its own bots, minus the Bot API probes,
+    # which the controller makes
+    for coroutine in (hoster.meter_bots(), hoster.hibernate_bots(), hoster.warm_pool.run(),
+                      hoster.measure_loop_lag(), collect_venv_garbage()):
+        asyncio.create_task(coroutine)
+    if hoster.METRICS_PORT:
+        asyncio.create_task(hoster.serve_metrics())
+
+    sessions = set()
+
+    async def on_connect(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        session = ControllerSession(reader, writer)
+        sessions.add(session)
+        try:
+            await session.run()
+        finally:
+            sessions.discard(session)
+
+    server = await asyncio.start_server(
+        on_connect, AGENT_HOST, AGENT_PORT, limit=hoster.STREAM_LINE_LIMIT, ssl=server_ssl_context()
+    )
+    logger.info(f"Agent listening on {AGENT_HOST}:{AGENT_PORT} in {os.getcwd()}")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    await stopping.wait()
+
+    # Bots keep running and are re-attached when the agent starts again
+    server.close()
+    for session in list(sessions):
+        session.writer.close()
+    while sessions:
+        await asyncio.sleep(0.05)
+    await hoster.shutdown_state()
+    logger.info("Agent stopped")
+
+def main() -> None:
+    hoster.make_undumpable()
+    try:
+        hoster.load_agent_secret()
+    except OSError as e:
+        logger.error(f"Could not read AGENT_SECRET_FILE: {e}")
+        sys.exit(1)
+    if not hoster.AGENT_SECRET:
+        logger.error("AGENT_SECRET is not set. Please set the secret shared with the controller.")
+        sys.exit(1)
+    os.makedirs("bots", exist_ok=True)
+    hoster.init_cgroups()
+    asyncio.run(serve())
+
+if __name__ == "__main__":
+    main()
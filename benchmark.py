@@ -0,0 +1,740 @@
+import os
+import sys
+import asyncio
+import argparse
+import base64
+import json
+import re
+import shutil
+import signal
+import socket
+import statistics
+import struct
+import subprocess
+import tempfile
+import time
+import zipfile
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+# Load test for main.py: runs the hoster against a local fake Bot API with a stub Nand.zip
+# and scripts simulated users through /host, /status and /stop.
+#
+#   python benchmark.py --users 50 --output results.json
+#   python benchmark.py --users 50 --compare baseline.json
+#   python benchmark.py --ingress webhook --compare polling.json
+
+HOSTER_TOKEN = "100000:BENCHMARKHOSTER"
+ADMIN_ID = 1  # Never one of the simulated users, so /stop does not stop everyone
+FIRST_USER_ID = 10000
+FIRST_BURST_USER_ID = 50000  # Users of the ingress burst, who only send /help
+STEP_TIMEOUT = 60  # Seconds to wait for a conversation reply
+SAMPLE_INTERVAL = 0.5  # Seconds between RSS and metrics samples
+
+# A user account's session in pyrogram's layout (DC, API ID, test mode, auth key, user ID, is bot),
+# so it passes the hoster's pre-flight decode
+STRING_SESSION = base64.urlsafe_b64encode(
+    struct.pack(">BI?256sQ?", 2, 1, False, bytes(256), 1, False)
+).decode().rstrip("=")
+
+# Answers to the /host conversation, each with the prompt that follows it
+CONVERSATION = [
+    ("/host", "Telegram API ID"),
+    ("None", "API Hash"),
+    ("None", "MongoDB URI"),
+    ("None", "Bot Token"),
+    (None, "Log Group ID"),  # Filled with the user's bot token
+    ("-1001234567890", "String Session"),
+    (STRING_SESSION, "Owner ID"),
+    ("None", "Start Image"),
+]
+DEPLOY_DONE = re.compile(r"successfully started|Error setting up bot|deployment has been cancelled")
+
+STUB_BOT = '''import signal
+import sys
+import time
+
+signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+print("Benchmark bot Started Successfully.", flush=True)
+while True:
+    time.sleep(3600)
+'''
+
+def build_stub_zip(path: str) -> None:
+    """Write a Nand.zip whose bot starts instantly and needs no dependencies."""
+    with zipfile.ZipFile(path, "w") as archive:
+        # Run as a module, like ShrutiMusic, so BOT_LAUNCH_MODE=zygote can fork it
+        archive.writestr("Nand/start", "python3 -m benchbot\n")
+        archive.writestr("Nand/requirements.txt", "")
+        archive.writestr("Nand/benchbot/__init__.py", "")
+        archive.writestr("Nand/benchbot/__main__.py", STUB_BOT)
+        archive.writestr("Nand/cookies/ShrutiBots.txt", "")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentiles(values: list) -> dict:
+    """Summarise a list of durations."""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        'count': len(ordered),
+        'mean': statistics.fmean(ordered),
+        'p50': pick(0.50),
+        'p90': pick(0.90),
+        'p99': pick(0.99),
+        'max': ordered[-1],
+    }
+
+class FakeBotAPI:
+    """Just enough of the Bot API over HTTP for the hoster and its bots' health checks.
+
+    Updates are served through getUpdates until the hoster sets a webhook, then POSTed to it.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency  # Simulated round trip to Telegram, in seconds
+        self.updates = []
+        self.update_id = 0
+        self.message_id = 0
+        self.new_update = asyncio.Condition()
+        self.chats: Dict[int, list] = {}  # chat_id: [(time, text), ...] sent or edited by the hoster
+        self.chat_changed: Dict[int, asyncio.Condition] = {}
+        self.calls: Dict[str, int] = {}
+        self.receiving = asyncio.Event()  # Set once the hoster polls or sets its webhook
+        self.webhook: Optional[dict] = None
+        self.deliveries = set()  # Webhook delivery tasks
+        self.delivery_slots: Optional[asyncio.Semaphore] = None
+        self.idle_connections = []  # (reader, writer) to the webhook
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.connections = {}  # writer: handler task
+        self.port = 0
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self._handle_connection, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self.server.close()
+        for task in self.deliveries:
+            task.cancel()
+        for _, writer in self.idle_connections:
+            writer.close()
+        for writer, handler in list(self.connections.items()):
+            writer.close()
+            # A handler can be parked in a getUpdates long poll the hoster walked away from
+            handler.cancel()
+        await asyncio.gather(*self.connections.values(), return_exceptions=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    def bot_user(self, token: str) -> dict:
+        bot_id = int(token.split(":")[0])
+        name = "bench_hoster_bot" if token == HOSTER_TOKEN else f"bench_{bot_id}_bot"
+        return {'id': bot_id, 'is_bot': True, 'first_name': name, 'username': name}
+
+    async def push_message(self, user_id: int, text: str) -> None:
+        """Send a private message from a user to the hoster."""
+        self.update_id += 1
+        self.message_id += 1
+        message = {
+            'message_id': self.message_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private', 'first_name': f"user{user_id}"},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}"},
+            'text': text,
+        }
+        if text.startswith("/"):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        update = {'update_id': self.update_id, 'message': message}
+        if self.webhook:
+            self._start_delivery(update)
+            return
+        async with self.new_update:
+            self.updates.append(update)
+            self.new_update.notify_all()
+
+    def _start_delivery(self, update: dict) -> None:
+        task = asyncio.create_task(self._deliver(update))
+        self.deliveries.add(task)
+        task.add_done_callback(self.deliveries.discard)
+
+    async def _deliver(self, update: dict) -> None:
+        """POST an update to the hoster's webhook, retrying until it is accepted, as Telegram does."""
+        data = json.dumps(update).encode()
+        async with self.delivery_slots:
+            await asyncio.sleep(self.latency / 2)
+            while self.webhook:
+                url = urlsplit(self.webhook['url'])
+                # Like Telegram, keep up to max_connections connections open and reuse them
+                connection = self.idle_connections.pop() if self.idle_connections else None
+                try:
+                    if connection is None:
+                        connection = await asyncio.open_connection(url.hostname, url.port or 80)
+                    reader, writer = connection
+                    writer.write(
+                        f"POST {url.path or '/'} HTTP/1.1\r\nHost: {url.netloc}\r\n"
+                        f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                        f"X-Telegram-Bot-Api-Secret-Token: {self.webhook['secret']}\r\n\r\n".encode() + data
+                    )
+                    status = (await reader.readline()).split()
+                    length = 0
+                    while True:
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        name, _, value = line.decode("latin-1").partition(":")
+                        if name.strip().lower() == "content-length":
+                            length = int(value)
+                    await reader.readexactly(length)
+                    self.idle_connections.append(connection)
+                    if len(status) > 1 and status[1] == b"200":
+                        self.calls['webhook delivery'] = self.calls.get('webhook delivery', 0) + 1
+                        return
+                except (OSError, asyncio.IncompleteReadError):
+                    if connection:
+                        connection[1].close()
+                await asyncio.sleep(0.1)
+
+    def cursor(self, chat_id: int) -> int:
+        return len(self.chats.get(chat_id, ()))
+
+    async def wait_for_text(self, chat_id: int, pattern, cursor: int, timeout: float = STEP_TIMEOUT) -> tuple:
+        """Wait for a message at or after cursor matching pattern; returns (time, text, next cursor)."""
+        condition = self.chat_changed.setdefault(chat_id, asyncio.Condition())
+        deadline = time.monotonic() + timeout
+        async with condition:
+            while True:
+                messages = self.chats.get(chat_id, [])
+                for index in range(cursor, len(messages)):
+                    sent_at, text = messages[index]
+                    if re.search(pattern, text):
+                        return sent_at, text, index + 1
+                cursor = len(messages)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"no reply matching {pattern!r} for user {chat_id}")
+                try:
+                    await asyncio.wait_for(condition.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _record(self, chat_id: int, text: str) -> None:
+        self.chats.setdefault(chat_id, []).append((time.monotonic(), text))
+        condition = self.chat_changed.setdefault(chat_id, asyncio.Condition())
+        async with condition:
+            condition.notify_all()
+
+    async def _get_updates(self, params: dict) -> list:
+        offset = int(params.get('offset') or 0)
+        timeout = float(params.get('timeout') or 0)
+        self.receiving.set()
+        async with self.new_update:
+            # Confirmed updates are dropped, as Telegram does
+            self.updates = [update for update in self.updates if update['update_id'] >= offset]
+            if not self.updates and timeout:
+                try:
+                    await asyncio.wait_for(self.new_update.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            return list(self.updates)
+
+    async def call(self, token: str, method: str, params: dict):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if method == "getMe":
+            return self.bot_user(token)
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if method == "setWebhook":
+            self.webhook = {'url': params['url'], 'secret': params.get('secret_token', "")}
+            self.delivery_slots = asyncio.Semaphore(int(params.get('max_connections') or 40))
+            # Updates sent before the webhook was set are delivered to it
+            pending, self.updates = self.updates, []
+            for update in pending:
+                self._start_delivery(update)
+            self.receiving.set()
+            return True
+        if method == "deleteWebhook":
+            self.webhook = None
+            for _, writer in self.idle_connections:
+                writer.close()
+            self.idle_connections.clear()
+            return True
+        if method == "getChatMember":
+            # Every simulated bot is an admin of its log group
+            return {
+                'status': "administrator", 'user': self.bot_user(token), 'can_be_edited': False,
+                'is_anonymous': False, 'can_manage_chat': True, 'can_delete_messages': True,
+                'can_manage_video_chats': True, 'can_restrict_members': True, 'can_promote_members': False,
+                'can_change_info': True, 'can_invite_users': True,
+            }
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = int(params['chat_id'])
+            await self._record(chat_id, params.get('text', ""))
+            if method == "sendMessage":
+                self.message_id += 1
+                message_id = self.message_id
+            else:
+                message_id = int(params['message_id'])
+            return {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': self.bot_user(token),
+                'text': params.get('text', ""),
+            }
+        return True
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                path = request_line.split()[1].decode()
+                match = re.match(r"^/bot([^/]+)/(\w+)", path)
+                if not match:
+                    payload, status = {'ok': False, 'error_code': 404, 'description': "Not Found"}, "404 Not Found"
+                else:
+                    if headers.get('content-type', "").startswith("application/json"):
+                        params = json.loads(body or b"{}")
+                    else:
+                        params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+                    # Half the round trip on the way in, half on the way back, so a long poll
+                    # answered by a new update still pays the return trip
+                    await asyncio.sleep(self.latency / 2)
+                    result = await self.call(match.group(1), match.group(2), params)
+                    await asyncio.sleep(self.latency / 2)
+                    payload, status = {'ok': True, 'result': result}, "200 OK"
+
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # Cancelled by stop(); finishing normally keeps asyncio from logging it
+            pass
+        finally:
+            self.connections.pop(writer, None)
+            writer.close()
+
+def read_process_tree(root_pid: int) -> dict:
+    """Return {pid: (ppid, session, rss_bytes)} for every process on the host."""
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    processes = {}
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        fields = stat[stat.rindex(b")") + 2:].split()
+        processes[int(entry.name)] = (int(fields[1]), int(fields[3]), int(fields[21]) * page_size)
+    return processes
+
+def read_pss(pid: int) -> int:
+    """Proportional set size of a process, which splits pages shared copy-on-write among their users."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+def tree_rss(root_pid: int) -> tuple:
+    """Return the hoster's RSS, and the RSS and PSS of the hoster and every process it started, in bytes."""
+    processes = read_process_tree(root_pid)
+    children = {}
+    for pid, (ppid, _, _) in processes.items():
+        children.setdefault(ppid, []).append(pid)
+    total = 0
+    total_pss = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid in processes:
+            total += processes[pid][2]
+            total_pss += read_pss(pid)
+            stack.extend(children.get(pid, ()))
+    return processes.get(root_pid, (0, 0, 0))[2], total, total_pss
+
+def disk_usage(path: str) -> int:
+    """Bytes allocated under path, counting each hardlinked inode once."""
+    seen = set()
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) in seen:
+                continue
+            seen.add((st.st_dev, st.st_ino))
+            total += st.st_blocks * 512
+    return total
+
+def parse_metrics(text: str) -> Dict[str, float]:
+    """Parse Prometheus text output into {series: value}."""
+    values = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, _, value = line.rpartition(" ")
+            values[series] = float(value)
+    return values
+
+async def scrape_metrics(port: int) -> Dict[str, float]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+        response = await reader.read()
+    finally:
+        writer.close()
+    return parse_metrics(response.partition(b"\r\n\r\n")[2].decode())
+
+class Benchmark:
+    """One run of the hoster under a scripted load."""
+
+    def __init__(self, args):
+        self.args = args
+        self.api = FakeBotAPI(args.api_latency / 1000)
+        self.workdir = ""
+        self.hoster: Optional[subprocess.Popen] = None
+        self.metrics_port = free_port()
+        self.webhook_port = free_port()
+        self.time_to_ready = []
+        self.reply_latency = []
+        self.status_latency = []
+        self.stop_latency = []
+        self.burst_latency = []
+        self.burst_wall_time = 0.0
+        self.failures = []
+        self.peak_rss = {'hoster': 0, 'total': 0, 'total_pss': 0}
+        self.peak_loop_lag = 0.0
+        self.peak_sweep = 0.0
+        self.disk_usage = 0
+
+    def hoster_env(self) -> dict:
+        env = dict(os.environ)
+        env.update({
+            'HOSTER_BOT_TOKEN': HOSTER_TOKEN,
+            'BOT_ADMIN_ID': str(ADMIN_ID),
+            'TELEGRAM_API_BASE_URL': self.api.base_url,
+            'METRICS_PORT': str(self.metrics_port),
+            'UPDATE_MODE': self.args.ingress,
+        })
+        if self.args.ingress == "webhook":
+            env['WEBHOOK_URL'] = f"http://127.0.0.1:{self.webhook_port}/telegram"
+            env['WEBHOOK_PORT'] = str(self.webhook_port)
+        # Benchmark defaults, overridable from the caller's environment
+        env.setdefault('MONITOR_INTERVAL', "5")
+        env.setdefault('METER_INTERVAL', "5")
+        env.setdefault('WARM_POOL_MIN', "0")
+        env.setdefault('WARM_POOL_MAX', "0")
+        env.setdefault('METRICS_LOG_INTERVAL', "0")
+        return env
+
+    async def start_hoster(self) -> None:
+        self.workdir = tempfile.mkdtemp(prefix="mhost-bench-", dir=self.args.workdir)
+        build_stub_zip(os.path.join(self.workdir, "Nand.zip"))
+        log = open(os.path.join(self.workdir, "hoster.log"), "wb")
+        self.hoster = subprocess.Popen(
+            [self.args.python, os.path.abspath(self.args.main)],
+            cwd=self.workdir,
+            env=self.hoster_env(),
+            stdout=log,
+            stderr=subprocess.STDOUT
+        )
+        log.close()
+        try:
+            await asyncio.wait_for(self.api.receiving.wait(), timeout=STEP_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise Exception(f"hoster did not start taking updates, see {self.workdir}/hoster.log")
+
+    async def stop_hoster(self) -> None:
+        if self.hoster and self.hoster.poll() is None:
+            self.hoster.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(asyncio.get_running_loop().run_in_executor(None, self.hoster.wait), 30)
+            except asyncio.TimeoutError:
+                self.hoster.kill()
+        # Bots and zygotes outlive the hoster by design, so whatever is left in the run's
+        # directory is killed here
+        workdir = os.path.realpath(self.workdir)
+        for pid in read_process_tree(0):
+            try:
+                if os.path.realpath(os.readlink(f"/proc/{pid}/cwd")).startswith(workdir):
+                    os.killpg(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    async def converse(self, user_id: int, text: str, pattern, cursor: int) -> tuple:
+        """Send a message and wait for the reply, recording its latency."""
+        sent = time.monotonic()
+        await self.api.push_message(user_id, text)
+        replied, reply, cursor = await self.api.wait_for_text(user_id, pattern, cursor)
+        return replied - sent, reply, cursor
+
+    async def deploy(self, user_id: int, record: bool = True) -> bool:
+        """Run one user through the /host conversation until the deploy finishes."""
+        cursor = self.api.cursor(user_id)
+        token = f"{user_id}:BENCHMARKTOKEN{user_id}"
+        for answer, prompt in CONVERSATION:
+            latency, _, cursor = await self.converse(user_id, answer or token, prompt, cursor)
+            if record:
+                self.reply_latency.append(latency)
+        sent = time.monotonic()
+        await self.api.push_message(user_id, "None")
+        done_at, text, _ = await self.api.wait_for_text(
+            user_id, DEPLOY_DONE, cursor, timeout=self.args.deploy_timeout
+        )
+        if "successfully started" not in text:
+            self.failures.append({'user_id': user_id, 'error': text[:500]})
+            return False
+        if record:
+            self.time_to_ready.append(done_at - sent)
+        return True
+
+    async def status(self, user_id: int) -> None:
+        latency, _, _ = await self.converse(user_id, "/status", r"currently|don't have", self.api.cursor(user_id))
+        self.status_latency.append(latency)
+
+    async def stop(self, user_id: int, record: bool = True) -> None:
+        latency, _, _ = await self.converse(
+            user_id, "/stop", r"stopped and removed|Error stopping|don't have", self.api.cursor(user_id)
+        )
+        if record:
+            self.stop_latency.append(latency)
+
+    async def burst(self) -> None:
+        """Send /help from many users at once, timing update-to-reply latency and intake throughput."""
+        users = [FIRST_BURST_USER_ID + index for index in range(self.args.burst)]
+
+        async def ask(user_id: int) -> None:
+            latency, _, _ = await self.converse(user_id, "/help", "Available Commands", self.api.cursor(user_id))
+            self.burst_latency.append(latency)
+
+        started = time.monotonic()
+        results = await asyncio.gather(*(ask(user_id) for user_id in users), return_exceptions=True)
+        self.burst_wall_time = time.monotonic() - started
+        for user_id, result in zip(users, results):
+            if isinstance(result, Exception):
+                self.failures.append({'user_id': user_id, 'error': f"burst: {result}"})
+
+    async def sample(self) -> None:
+        """Track peak memory, event loop lag and sweep time while the load runs."""
+        loop = asyncio.get_running_loop()
+        while True:
+            hoster_rss, total_rss, total_pss = await loop.run_in_executor(None, tree_rss, self.hoster.pid)
+            self.peak_rss['hoster'] = max(self.peak_rss['hoster'], hoster_rss)
+            self.peak_rss['total'] = max(self.peak_rss['total'], total_rss)
+            self.peak_rss['total_pss'] = max(self.peak_rss['total_pss'], total_pss)
+            try:
+                values = await scrape_metrics(self.metrics_port)
+                self.peak_loop_lag = max(self.peak_loop_lag, values.get('mhost_event_loop_lag_last_seconds', 0))
+                self.peak_sweep = max(self.peak_sweep, values.get('mhost_monitor_sweep_seconds', 0))
+            except OSError:
+                pass
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    async def run(self) -> dict:
+        await self.api.start()
+        await self.start_hoster()
+        sampler = None
+        try:
+            if self.args.warmup:
+                # Builds the template and the shared venv, so timings reflect steady state
+                if await self.deploy(FIRST_USER_ID - 1, record=False):
+                    await self.stop(FIRST_USER_ID - 1, record=False)
+                self.failures.clear()
+
+            sampler = asyncio.create_task(self.sample())
+            if self.args.burst:
+                await self.burst()
+            users = [FIRST_USER_ID + index for index in range(self.args.users)]
+            semaphore = asyncio.Semaphore(self.args.concurrency or len(users))
+
+            async def deploy_user(user_id: int) -> bool:
+                async with semaphore:
+                    try:
+                        return await self.deploy(user_id)
+                    except Exception as e:
+                        self.failures.append({'user_id': user_id, 'error': str(e)})
+                        return False
+
+            started = time.monotonic()
+            deployed = await asyncio.gather(*(deploy_user(user_id) for user_id in users))
+            deploy_wall_time = time.monotonic() - started
+            hosted = [user_id for user_id, ok in zip(users, deployed) if ok]
+
+            await asyncio.gather(*(self.status(user_id) for user_id in hosted), return_exceptions=True)
+            # Let at least one health sweep and resource sample run over the full fleet
+            await asyncio.sleep(self.args.hold)
+            self.disk_usage = await asyncio.get_running_loop().run_in_executor(None, disk_usage, self.workdir)
+            metrics = await scrape_metrics(self.metrics_port)
+
+            started = time.monotonic()
+            await asyncio.gather(*(self.stop(user_id) for user_id in hosted), return_exceptions=True)
+            stop_wall_time = time.monotonic() - started
+        finally:
+            if sampler:
+                sampler.cancel()
+            await self.stop_hoster()
+            await self.api.stop()
+
+        lag_count = metrics.get('mhost_event_loop_lag_seconds_count', 0)
+        phases = {}
+        for series, value in metrics.items():
+            match = re.match(r'mhost_deploy_phase_seconds_sum\{phase="(\w+)"\}', series)
+            if match:
+                count = metrics.get(f'mhost_deploy_phase_seconds_count{{phase="{match.group(1)}"}}', 0)
+                phases[match.group(1)] = value / count if count else 0.0
+        return {
+            'deploys': {'ok': len(hosted), 'failed': len(self.failures), 'wall_time': deploy_wall_time},
+            'time_to_ready': percentiles(self.time_to_ready),
+            'reply_latency': percentiles(self.reply_latency),
+            'status_latency': percentiles(self.status_latency),
+            'stop_latency': percentiles(self.stop_latency),
+            'stop_wall_time': stop_wall_time,
+            'ingress': {
+                'updates': len(self.burst_latency),
+                'wall_time': self.burst_wall_time,
+                'updates_per_second': len(self.burst_latency) / self.burst_wall_time if self.burst_wall_time else 0.0,
+                'latency': percentiles(self.burst_latency),
+            },
+            'deploy_phase_mean': phases,
+            'event_loop_lag': {
+                'mean': metrics.get('mhost_event_loop_lag_seconds_sum', 0) / lag_count if lag_count else 0.0,
+                'max': self.peak_loop_lag,
+            },
+            'monitor_sweep_seconds': {
+                'last': metrics.get('mhost_monitor_sweep_seconds', 0),
+                'max': self.peak_sweep,
+            },
+            'peak_rss_bytes': dict(self.peak_rss),
+            'disk_usage_bytes': self.disk_usage,
+            'api_calls': dict(self.api.calls),
+            'failures': self.failures[:20],
+        }
+
+def git_revision(path: str) -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=path, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def flatten(data: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(baseline: dict, current: dict) -> None:
+    """Print every numeric result next to the baseline's."""
+    old = flatten(baseline['results'])
+    new = flatten(current['results'])
+    print(f"{'metric':<40} {'baseline':>14} {'current':>14} {'change':>9}")
+    for name in sorted(set(old) & set(new)):
+        change = f"{(new[name] - old[name]) / old[name] * 100:+.1f}%" if old[name] else ""
+        print(f"{name:<40} {old[name]:>14.4g} {new[name]:>14.4g} {change:>9}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the hoster against a local fake Bot API.")
+    parser.add_argument("--users", type=int, default=50, help="simulated users deploying a bot")
+    parser.add_argument("--concurrency", type=int, default=0, help="users in the /host flow at once, 0 for all")
+    parser.add_argument("--hold", type=float, default=12, help="seconds to keep the fleet running before /stop")
+    parser.add_argument("--ingress", choices=("polling", "webhook"), default="polling",
+                        help="how the hoster takes in updates")
+    parser.add_argument("--api-latency", type=float, default=0, help="simulated round trip to Telegram in milliseconds")
+    parser.add_argument("--burst", type=int, default=200, help="users sending /help at once to time update intake")
+    parser.add_argument("--deploy-timeout", type=float, default=600, help="seconds one deploy may take")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false",
+                        help="include the first template and venv build in the timings")
+    parser.add_argument("--main", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"),
+                        help="hoster script to benchmark")
+    parser.add_argument("--python", default=sys.executable, help="interpreter that runs the hoster")
+    parser.add_argument("--workdir", default=None, help="parent directory for the run's files")
+    parser.add_argument("--keep", action="store_true", help="keep the run's working directory")
+    parser.add_argument("--output", default="benchmark-results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", default=None, help="earlier results to compare against")
+    args = parser.parse_args()
+
+    benchmark = Benchmark(args)
+    started = time.time()
+    try:
+        results = asyncio.run(benchmark.run())
+    finally:
+        if benchmark.workdir and not args.keep:
+            shutil.rmtree(benchmark.workdir, ignore_errors=True)
+
+    report = {
+        'revision': git_revision(os.path.dirname(os.path.abspath(args.main))),
+        'started_at': started,
+        'config': {
+            'users': args.users,
+            'concurrency': args.concurrency,
+            'hold': args.hold,
+            'ingress': args.ingress,
+            'burst': args.burst,
+            'api_latency_ms': args.api_latency,
+            'warmup': args.warmup,
+            'python': args.python,
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    ready = results['time_to_ready']
+    ingress = results['ingress']
+    if ingress['updates']:
+        print(f"Update intake ({args.ingress}): {ingress['updates']} updates at {ingress['updates_per_second']:.0f}/s, "
+              f"reply p50 {ingress['latency']['p50'] * 1000:.1f}ms, p99 {ingress['latency']['p99'] * 1000:.1f}ms")
+    print(f"Deployed {results['deploys']['ok']}/{args.users} bots in {results['deploys']['wall_time']:.1f}s")
+    if ready['count']:
+        print(f"Time to ready: p50 {ready['p50']:.2f}s, p90 {ready['p90']:.2f}s, p99 {ready['p99']:.2f}s")
+    print(f"Event loop lag: mean {results['event_loop_lag']['mean'] * 1000:.1f}ms, "
+          f"max {results['event_loop_lag']['max'] * 1000:.1f}ms")
+    print(f"Peak RSS: hoster {results['peak_rss_bytes']['hoster'] / 2**20:.1f}MB, "
+          f"total {results['peak_rss_bytes']['total'] / 2**20:.1f}MB "
+          f"(PSS {results['peak_rss_bytes']['total_pss'] / 2**20:.1f}MB); "
+          f"disk {results['disk_usage_bytes'] / 2**20:.1f}MB")
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import os
+import sys
+import fcntl
+import gc
+import importlib
+import json
+import runpy
+import selectors
+import signal
+import socket
+import traceback
+
+# Fork server started by main.py in BOT_LAUNCH_MODE=zygote, running on a bot venv's interpreter.
+# It imports the venv's heavy modules once, then forks one child per bot so the children share
+# those pages copy-on-write instead of each importing them from scratch.
+#
+#   python zygote.py <socket path> <module,module,...>
+#
+# Each request is one JSON line on its own connection:
+#   {"cwd": ..., "env": {...}, "module": ..., "output": <fifo path>, "cgroup": <dir or null>}
+# answered with {"pid": ...} once forked, then {"exit": <code>} when the child exits.
+# {"exit": true} shuts the zygote down; children already forked keep running.
+
+PIPE_SIZE = 1024 * 1024  # Output buffered in the FIFO while the hoster restarts
+REQUEST_LIMIT = 1024 * 1024  # Max bytes of one request line
+
+def preload(modules: list) -> None:
+    """Import modules that every bot would otherwise import itself."""
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"Zygote: could not preload {name}: {e}", file=sys.stderr, flush=True)
+    # Preloaded objects are never collected, so the collector does not touch (and copy) their pages
+    gc.collect()
+    gc.freeze()
+
+def run_child(request: dict) -> None:
+    """Turn the forked child into the bot described by request. Never returns."""
+    code = 1
+    try:
+        # Own session and process group, so the supervisor can signal the bot's whole tree
+        os.setsid()
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.set_wakeup_fd(-1)
+
+        if request.get('cgroup'):
+            with open(os.path.join(request['cgroup'], "cgroup.procs"), "w") as f:
+                f.write(str(os.getpid()))
+
+        # Same output wiring as a directly launched bot: the FIFO on stdout and stderr, plus
+        # a read end kept open so writes buffer instead of failing while the hoster is down
+        write_fd = os.open(request['output'], os.O_WRONLY)
+        os.open(request['output'], os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            fcntl.fcntl(write_fd, fcntl.F_SETPIPE_SZ, PIPE_SIZE)
+        except OSError:
+            pass
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(write_fd, 1)
+        os.dup2(write_fd, 2)
+        os.close(devnull)
+        os.close(write_fd)
+        sys.stdout.reconfigure(line_buffering=True)
+
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        # As with python -m, the working directory comes first on the import path
+        sys.path.insert(0, request['cwd'])
+        sys.argv = [request['module']]
+        runpy.run_module(request['module'], run_name="__main__", alter_sys=True)
+        code = 0
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+def send(conn: socket.socket, message: dict) -> None:
+    try:
+        conn.sendall(json.dumps(message).encode() + b"\n")
+    except OSError:
+        # The hoster went away; the bot keeps running and is re-attached by pid
+        pass
+
+def read_request(conn: socket.socket) -> bytes:
+    data = b""
+    while not data.endswith(b"\n") and len(data) < REQUEST_LIMIT:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+def main() -> None:
+    socket_path = sys.argv[1]
+    preload([name for name in sys.argv[2].split(",") if name])
+
+    wake_read, wake_write = os.pipe()
+    os.set_blocking(wake_write, False)
+    signal.set_wakeup_fd(wake_write)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+    # Detach from the hoster's terminal signals; the hoster stops the zygote explicitly
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    listener.listen(64)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    selector.register(wake_read, selectors.EVENT_READ)
+    connections = set()
+    children = {}  # pid: connection waiting for the exit code, None once the hoster hung up
+
+    def close(conn: socket.socket) -> None:
+        selector.unregister(conn)
+        connections.discard(conn)
+        conn.close()
+
+    print("ready", flush=True)
+    # Nothing reads stdout after startup
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj is listener:
+                conn, _ = listener.accept()
+                connections.add(conn)
+                selector.register(conn, selectors.EVENT_READ)
+            elif key.fileobj == wake_read:
+                os.read(wake_read, 4096)
+                # Reap every exited child and report its exit code
+                while True:
+                    try:
+                        pid, status = os.waitpid(-1, os.WNOHANG)
+                    except ChildProcessError:
+                        break
+                    if pid == 0:
+                        break
+                    conn = children.pop(pid, None)
+                    if conn is not None:
+                        send(conn, {'exit': os.waitstatus_to_exitcode(status)})
+                        close(conn)
+            else:
+                conn = key.fileobj
+                if conn in children.values():
+                    # The hoster closed the connection of a running child
+                    if not conn.recv(1):
+                        for pid, child_conn in children.items():
+                            if child_conn is conn:
+                                children[pid] = None
+                        close(conn)
+                    continue
+                try:
+                    request = json.loads(read_request(conn))
+                except (OSError, ValueError):
+                    close(conn)
+                    continue
+                if request.get('exit') is True:
+                    os.unlink(socket_path)
+                    return
+                pid = os.fork()
+                if pid == 0:
+                    listener.close()
+                    for other in connections:
+                        other.close()
+                    os.close(wake_read)
+                    os.close(wake_write)
+                    run_child(request)
+                children[pid] = conn
+                send(conn, {'pid': pid})
+
+if __name__ == "__main__":
+    main()